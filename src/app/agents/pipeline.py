@@ -7,13 +7,84 @@ Cleans Markdown code fences (```json ... ```) from Gemini output before parsing.
 """
 
 import os
-import json
-import uuid
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
-from src.app.core.schema import SceneSchema, SceneInputConstraints
+import orjson
+from src.app.core.schema import Action, Meta, Row, SceneItem, SceneSchema, SceneInputConstraints
 
 
+logger = logging.getLogger("scene_builder")
+
+_MODEL_NAME = "gemini-2.5-flash"
+
+_SYSTEM_PROMPT = (
+    "You are a Cinematic Scene Builder AI Assistant.\n"
+    "Your task is to create a realistic cinematic storyboard in structured JSON format based on the user's idea or theme.\n\n"
+
+    "The goal is to simulate a short video or film concept, written like a visual script with camera directions, scene titles, dialogues, and transitions.\n"
+    "The result must be emotionally coherent, cinematic, and ready for production planning.\n\n"
+
+    "Output only valid JSON — no markdown, no commentary, no text outside JSON.\n\n"
+
+    "Your JSON structure must look exactly like this:\n"
+    "{\n"
+    "  'processId': 'unique_identifier_for_video',\n"
+    "  'plan': {\n"
+    "    'title': 'Short descriptive title of the full video',\n"
+    "    'summary': '2-3 line story summary of the full video',\n"
+    "    'themes': ['teamwork', 'resilience', 'hope']\n"
+    "  },\n"
+    "  'scenes': [\n"
+    "    {\n"
+    "      'id': 'scene_01',\n"
+    "      'title': 'Short scene title',\n"
+    "      'description': 'One-line cinematic summary of what happens',\n"
+    "      'script': [\n"
+    "         'Camera pans across a dark office. The hum of computers fills the air.',\n"
+    "         'SARAH: We’re not done yet. Not tonight.',\n"
+    "         'Mark looks up, determination in his eyes.'\n"
+    "      ],\n"
+    "      'assets': [\n"
+    "         {'type': 'video', 'src': 'office_nightwide.mp4', 'description': 'Wide shot of office at night'},\n"
+    "         {'type': 'audio', 'src': 'ambient_keyboard_typing.mp3', 'description': 'Subtle background typing and clicking'},\n"
+    "         {'type': 'text', 'src': '02:47 AM', 'description': 'Overlay timestamp in bottom-right corner'}\n"
+    "      ],\n"
+    "      'effects': [\n"
+    "         {'type': 'camera', 'name': 'slow_zoom_in'},\n"
+    "         {'type': 'color', 'name': 'blue_tint', 'intensity': 0.3}\n"
+    "      ],\n"
+    "      'transitions': [\n"
+    "         {'type': 'fade', 'direction': 'out', 'durationSec': 1.2}\n"
+    "      ],\n"
+    "      'durationSec': 4.0\n"
+    "    }\n"
+    "  ],\n"
+    "  'meta': {\n"
+    "    'totalDurationSec': <total_duration>,\n"
+    "    'aspectRatio': '<aspect_ratio>',\n"
+    "    'fps': <fps>,\n"
+    "    'language': '<language>',\n"
+    "    'deterministic': <deterministic_flag>,\n"
+    "    'tone': 'cinematic / motivational / dramatic'\n"
+    "  }\n"
+    "}\n\n"
+
+    "Guidelines:\n"
+    "- Every scene should have a unique and meaningful title.\n"
+    "- The 'script' array should describe visual camera actions and short dialogue lines.\n"
+    "- Include transitions and effects where natural.\n"
+    "- Keep tone consistent with the theme and duration constraints.\n"
+    "- Ensure the total duration roughly matches the constraint.\n"
+)
+
+
+@lru_cache(maxsize=1)
 def _get_gemini():
+    # memoized so a missing SDK isn't re-imported (a full sys.path walk) per request
     try:
         import google.generativeai as genai  # type: ignore
         return genai
@@ -21,23 +92,62 @@ def _get_gemini():
         return None
 
 
+@lru_cache(maxsize=1)
+def _get_model(api_key: str):
+    """
+    Configure the Gemini client once per API key and reuse the model object.
+    The static system prompt is passed as system_instruction so every request
+    shares a byte-identical prefix that Gemini can cache implicitly.
+    """
+    genai = _get_gemini()
+    if genai is None:
+        return None
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(_MODEL_NAME, system_instruction=_SYSTEM_PROMPT)
+
+
 def _clean_gemini_json(text: str) -> str:
-    """Remove Markdown code fences or extraneous text from Gemini output."""
+    """
+    Extract the outermost JSON object from Gemini output. Slicing from the
+    first '{' to the last '}' drops Markdown code fences and any surrounding
+    commentary in a single find/rfind pair without intermediate copies.
+    """
     if not text:
         return text
-    text = text.strip()
-    if text.startswith("```"):
-        text = text.strip("`")
-        if text.lower().startswith("json"):
-            text = text[4:]
-        text = text.replace("```", "")
     start = text.find("{")
     end = text.rfind("}")
-    if start != -1 and end != -1:
-        text = text[start:end + 1]
+    if start != -1 and end > start:
+        return text[start:end + 1]
     return text.strip()
 
 
+# LLM asset types that map onto a different Action.type
+_ASSET_TYPE_MAP = {"music": "audio"}
+
+
+def _normalize_action(asset: Dict[str, Any], idx: int, aidx: int, duration: float) -> Dict[str, Any]:
+    """Map one LLM asset onto an Action-compatible dict."""
+    asset_type = asset.get("type", "video").lower()
+
+    effects = asset.get("effects") or []
+    if isinstance(effects, dict):
+        effects = [effects]
+
+    # only copy the asset when it carries no explicit props
+    props = asset.get("props")
+    if props is None:
+        props = {**asset, "src": asset.get("src", "")}
+
+    return {
+        "id": asset.get("id", f"action-{idx}-{aidx}"),
+        "type": _ASSET_TYPE_MAP.get(asset_type, asset_type),
+        "startSec": float(asset.get("startSec", 0)),
+        "durationSec": float(asset.get("durationSec", duration)),
+        "props": props,
+        "effects": effects,
+    }
+
+
 def _normalize_to_scene_schema(raw_scene: Dict[str, Any], *_, **__) -> SceneSchema:
     """
     Normalize raw LLM JSON output into SceneSchema-compatible format.
@@ -50,49 +160,22 @@ def _normalize_to_scene_schema(raw_scene: Dict[str, Any], *_, **__) -> SceneSche
         rows = []
         assets = sc.get("assets", [])
 
-        # Scene-level normalization
-        scene_effects = sc.get("effects", [])
-        if isinstance(scene_effects, dict):
-            scene_effects = [scene_effects]
-
-        scene_transitions = sc.get("transitions", [])
+        scene_transitions = sc.get("transitions") or []
         if isinstance(scene_transitions, dict):
             scene_transitions = [scene_transitions]
 
         # Normalize transitions to include 'name'
         for t in scene_transitions:
-            if "name" not in t or not t["name"]:
+            if not t.get("name"):
                 t["name"] = t.get("type", "unknown")
 
         duration = sc.get("durationSec", 3)
 
         # Build a single row for simplicity (can expand later)
-        row_actions = []
-        for aidx, asset in enumerate(assets, 1):
-            effects = asset.get("effects", [])
-            if isinstance(effects, dict):
-                effects = [effects]
-            elif effects is None:
-                effects = []
-
-            asset_type = asset.get("type", "video").lower()
-            if asset_type == "music":
-                asset_type = "audio"
-
-            action = {
-                "id": asset.get("id", f"action-{idx}-{aidx}"),
-                "type": asset_type,
-                "startSec": float(asset.get("startSec", 0)),
-                "durationSec": float(asset.get("durationSec", duration)),
-                "props": asset.get("props", {**asset, "src": asset.get("src", "")}),
-                "effects": effects
-            }
-            row_actions.append(action)
-
-        # Normalize row-level transitions too
-        for t in scene_transitions:
-            if "name" not in t or not t["name"]:
-                t["name"] = t.get("type", "unknown")
+        row_actions = [
+            _normalize_action(asset, idx, aidx, duration)
+            for aidx, asset in enumerate(assets, 1)
+        ]
 
         row = {
             "id": f"row-{idx}-1",
@@ -122,135 +205,212 @@ def _normalize_to_scene_schema(raw_scene: Dict[str, Any], *_, **__) -> SceneSche
         meta=meta
     )
 
-def _make_plan(prompt: str, normalized_scene: Dict[str, Any]) -> Dict[str, Any]:
-    scenes_count = len(normalized_scene.get("scenes", []))
+def _build_mock_scene_schema(prompt: str, constraints: Optional[SceneInputConstraints]) -> SceneSchema:
+    """
+    Build the fallback scene used when no LLM output is available.
+    The shape is fixed, so it is constructed directly instead of going through
+    _normalize_to_scene_schema; the result matches what normalization produced
+    for the old mock dict (one scene, one video row, a video and a text action).
+    """
+    duration = constraints.totalDurationSec if constraints and getattr(constraints, "totalDurationSec", None) else 10
+    aspect_ratio = constraints.aspectRatio if constraints and getattr(constraints, "aspectRatio", None) else "16:9"
+    fps = constraints.fps if constraints and getattr(constraints, "fps", None) else 30
+    return SceneSchema(
+        scenes=[
+            SceneItem(
+                id="1",
+                title="Intro",
+                durationSec=duration,
+                rows=[
+                    Row(
+                        id="row-1-1",
+                        kind="video",
+                        actions=[
+                            Action(
+                                id="action-1-1",
+                                type="video",
+                                startSec=0.0,
+                                durationSec=float(duration),
+                                props={"type": "video", "src": "placeholder_intro.mp4"},
+                            ),
+                            Action(
+                                id="action-1-2",
+                                type="text",
+                                startSec=0.0,
+                                durationSec=float(duration),
+                                props={"type": "text", "src": prompt},
+                            ),
+                        ],
+                    )
+                ],
+            )
+        ],
+        meta=Meta(totalDurationSec=duration, aspectRatio=aspect_ratio, fps=fps),
+    )
+
+
+_CONSTRAINT_FIELDS = tuple(SceneInputConstraints.model_fields)
+
+
+@lru_cache(maxsize=256)
+def _dump_constraint_values(values: tuple) -> str:
+    return SceneInputConstraints.model_construct(**dict(zip(_CONSTRAINT_FIELDS, values))).model_dump_json()
+
+
+def dump_constraints(constraints: Optional[SceneInputConstraints]) -> str:
+    """
+    Serialize constraints to the canonical JSON used in cache keys (None -> "{}").
+    FastAPI rebuilds the model per request, so the memo is keyed on field values
+    rather than the instance.
+    """
+    if constraints is None:
+        return "{}"
+    return _dump_constraint_values(tuple(getattr(constraints, f) for f in _CONSTRAINT_FIELDS))
+
+
+def _make_plan(prompt: str, normalized_scene: SceneSchema) -> Dict[str, Any]:
+    scenes_count = len(normalized_scene.scenes)
     notes = f"Generated {scenes_count} scene(s) from prompt"
     return {"scenesCount": scenes_count, "notes": notes, "prompt": prompt}
 
 
-def run_pipeline(prompt: str, constraints: Optional[SceneInputConstraints] = None) -> Dict[str, Any]:
-    """Main entry for cinematic scene generation."""
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    raw_output = None
+# Response cache: exact match on (prompt, constraints) plus an optional
+# embedding-similarity tier used when fastembed is installed.
+_RESP_CACHE_MAX = 256
+_RESP_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_SEMANTIC_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_SEMANTIC_THRESHOLD = 0.95
+_EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_CACHE_LOCK = threading.Lock()
 
-    if gemini_key:
-        genai = _get_gemini()
-        if genai:
-            try:
-                genai.configure(api_key=gemini_key)
-                model = genai.GenerativeModel("gemini-2.5-flash")
 
-                system_prompt = (
-    "You are a Cinematic Scene Builder AI Assistant.\n"
-    "Your task is to create a realistic cinematic storyboard in structured JSON format based on the user's idea or theme.\n\n"
+@lru_cache(maxsize=1)
+def _get_embedder():
+    try:
+        from fastembed import TextEmbedding  # type: ignore
+        return TextEmbedding(_EMBED_MODEL_NAME)
+    except Exception:
+        return None
 
-    "The goal is to simulate a short video or film concept, written like a visual script with camera directions, scene titles, dialogues, and transitions.\n"
-    "The result must be emotionally coherent, cinematic, and ready for production planning.\n\n"
 
-    "Output only valid JSON — no markdown, no commentary, no text outside JSON.\n\n"
+def warm_up_embedder() -> bool:
+    """
+    Load the optional embedding model ahead of the first request. fastembed
+    downloads the model on first use, which would otherwise happen inside a
+    request. Returns whether the semantic cache tier is available.
+    """
+    return _get_embedder() is not None
 
-    "Your JSON structure must look exactly like this:\n"
-    "{\n"
-    "  'processId': 'unique_identifier_for_video',\n"
-    "  'plan': {\n"
-    "    'title': 'Short descriptive title of the full video',\n"
-    "    'summary': '2-3 line story summary of the full video',\n"
-    "    'themes': ['teamwork', 'resilience', 'hope']\n"
-    "  },\n"
-    "  'scenes': [\n"
-    "    {\n"
-    "      'id': 'scene_01',\n"
-    "      'title': 'Short scene title',\n"
-    "      'description': 'One-line cinematic summary of what happens',\n"
-    "      'script': [\n"
-    "         'Camera pans across a dark office. The hum of computers fills the air.',\n"
-    "         'SARAH: We’re not done yet. Not tonight.',\n"
-    "         'Mark looks up, determination in his eyes.'\n"
-    "      ],\n"
-    "      'assets': [\n"
-    "         {'type': 'video', 'src': 'office_nightwide.mp4', 'description': 'Wide shot of office at night'},\n"
-    "         {'type': 'audio', 'src': 'ambient_keyboard_typing.mp3', 'description': 'Subtle background typing and clicking'},\n"
-    "         {'type': 'text', 'src': '02:47 AM', 'description': 'Overlay timestamp in bottom-right corner'}\n"
-    "      ],\n"
-    "      'effects': [\n"
-    "         {'type': 'camera', 'name': 'slow_zoom_in'},\n"
-    "         {'type': 'color', 'name': 'blue_tint', 'intensity': 0.3}\n"
-    "      ],\n"
-    "      'transitions': [\n"
-    "         {'type': 'fade', 'direction': 'out', 'durationSec': 1.2}\n"
-    "      ],\n"
-    "      'durationSec': 4.0\n"
-    "    }\n"
-    "  ],\n"
-    "  'meta': {\n"
-    "    'totalDurationSec': <total_duration>,\n"
-    "    'aspectRatio': '<aspect_ratio>',\n"
-    "    'fps': <fps>,\n"
-    "    'language': '<language>',\n"
-    "    'deterministic': <deterministic_flag>,\n"
-    "    'tone': 'cinematic / motivational / dramatic'\n"
-    "  }\n"
-    "}\n\n"
 
-    "Guidelines:\n"
-    "- Every scene should have a unique and meaningful title.\n"
-    "- The 'script' array should describe visual camera actions and short dialogue lines.\n"
-    "- Include transitions and effects where natural.\n"
-    "- Keep tone consistent with the theme and duration constraints.\n"
-    "- Ensure the total duration roughly matches the constraint.\n"
-)
-                full_prompt = f"{system_prompt}\nUser Prompt: {prompt}\nConstraints: {json.dumps((constraints.model_dump() if hasattr(constraints, 'model_dump') else dict(constraints)) if constraints else {})}"
-                response = model.generate_content(full_prompt)
+def _embed(text: str):
+    """Return a unit-normalized embedding for text, or None if unavailable."""
+    embedder = _get_embedder()
+    if embedder is None:
+        return None
+    try:
+        import numpy as np
+        vec = np.asarray(next(iter(embedder.embed([text]))), dtype="float32")
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+    except Exception:
+        return None
 
-                if hasattr(response, "text") and response.text:
-                    raw_output = response.text.strip()
-                elif hasattr(response, "candidates") and len(response.candidates) > 0:
-                    raw_output = response.candidates[0].content.parts[0].text.strip()
-            except Exception as e:
-                print("Gemini API call failed:", str(e))
-                raw_output = ""
 
-    # Fallback mock output if no Gemini response
-    if not raw_output or not raw_output.strip():
-        mock_scene = {
-            "processId": f"proc-{uuid.uuid4().hex[:8]}",
-            "plan": {
-                "title": "Mock Plan",
-                "summary": "Fallback mock plan if LLM unavailable.",
-                "themes": ["mock"]
-            },
-            "scenes": [
-                {
-                    "id": "1",
-                    "title": "Intro",
-                    "description": prompt,
-                    "assets": [
-                        {"type": "video", "src": "placeholder_intro.mp4"},
-                        {"type": "text", "src": prompt}
-                    ],
-                    "effects": [{"type": "transition", "name": "fadeIn"}],
-                    "durationSec": (constraints.totalDurationSec if constraints and getattr(constraints, "totalDurationSec", None) else 10)
-                }
-            ],
-            "meta": {
-                "totalDurationSec": (constraints.totalDurationSec if constraints and getattr(constraints, "totalDurationSec", None) else 10),
-                "aspectRatio": (constraints.aspectRatio if constraints and getattr(constraints, "aspectRatio", None) else "16:9"),
-                "fps": (constraints.fps if constraints and getattr(constraints, "fps", None) else 30),
-                "language": "en"
-            }
-        }
-        raw_output = json.dumps(mock_scene)
+def _cache_lookup(key: tuple, prompt: str, semantic: bool):
+    """
+    Look up a cached pipeline result. Returns (result, embedding); the
+    embedding is computed for semantic lookups so it can be reused on store.
+    """
+    with _CACHE_LOCK:
+        hit = _RESP_CACHE.get(key)
+        if hit is not None:
+            _RESP_CACHE.move_to_end(key)
+            return copy.deepcopy(hit), None
+
+    if not semantic:
+        return None, None
+    vec = _embed(prompt)
+    if vec is None:
+        return None, None
+
+    best, best_score = None, _SEMANTIC_THRESHOLD
+    with _CACHE_LOCK:
+        for (_, constraints_json), (cached_vec, result) in _SEMANTIC_CACHE.items():
+            if constraints_json != key[1]:
+                continue
+            score = float(cached_vec @ vec)
+            if score >= best_score:
+                best, best_score = result, score
+        if best is not None:
+            best = copy.deepcopy(best)
+    if best is not None:
+        # plan echoes the caller's prompt, not the one that populated the cache
+        best["plan"] = _make_plan(prompt, best["scene"])
+    return best, vec
+
+
+def _cache_store(key: tuple, result: Dict[str, Any], vec=None) -> None:
+    with _CACHE_LOCK:
+        _RESP_CACHE[key] = copy.deepcopy(result)
+        _RESP_CACHE.move_to_end(key)
+        if len(_RESP_CACHE) > _RESP_CACHE_MAX:
+            _RESP_CACHE.popitem(last=False)
+        if vec is not None:
+            _SEMANTIC_CACHE[key] = (vec, _RESP_CACHE[key])
+            if len(_SEMANTIC_CACHE) > _RESP_CACHE_MAX:
+                _SEMANTIC_CACHE.popitem(last=False)
 
-    try:
-        cleaned_output = _clean_gemini_json(raw_output)
-        parsed = json.loads(cleaned_output)
-    except Exception as e:
-        raise ValueError(f"Failed to parse LLM output as JSON: {e}")
-
-    normalized = _normalize_to_scene_schema(
-    parsed, prompt,
-    (constraints.model_dump() if hasattr(constraints, "model_dump") else (dict(constraints) if isinstance(constraints, dict) else None))
-)
-    plan = _make_plan(prompt, normalized.model_dump())
-    return {"plan": plan, "scene": normalized.model_dump()}
+
+def run_pipeline(prompt: str, constraints: Optional[SceneInputConstraints] = None) -> Dict[str, Any]:
+    """Main entry for cinematic scene generation. Returns the plan and the validated SceneSchema."""
+    constraints_json = dump_constraints(constraints)
+    cache_key = (prompt, constraints_json)
+    semantic = not getattr(constraints, "deterministic", False)
+    cached, prompt_vec = _cache_lookup(cache_key, prompt, semantic)
+    if cached is not None:
+        return cached
+
+    gemini_key = os.getenv("GEMINI_API_KEY")
+    raw_output = None
+
+    if gemini_key:
+        try:
+            model = _get_model(gemini_key)
+            if model is not None:
+                user_prompt = f"User Prompt: {prompt}\nConstraints: {constraints_json}"
+                response = model.generate_content(user_prompt, stream=True)
+
+                # collect chunks as they arrive and join once at the end
+                chunks = []
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # chunk carries no text parts (e.g. finish/safety metadata)
+                        continue
+                    if text:
+                        chunks.append(text)
+                raw_output = "".join(chunks).strip()
+        except Exception as e:
+            logger.warning("Gemini API call failed: %s", e)
+            raw_output = ""
+
+    # Fallback mock output if no Gemini response
+    from_llm = bool(raw_output and raw_output.strip())
+    if not from_llm:
+        normalized = _build_mock_scene_schema(prompt, constraints)
+    else:
+        try:
+            cleaned_output = _clean_gemini_json(raw_output)
+            parsed = orjson.loads(cleaned_output)
+        except Exception as e:
+            raise ValueError(f"Failed to parse LLM output as JSON: {e}")
+        normalized = _normalize_to_scene_schema(parsed)
+
+    plan = _make_plan(prompt, normalized)
+    result = {"plan": plan, "scene": normalized}
+    # only cache real LLM output so a transient failure doesn't pin the mock
+    if from_llm:
+        _cache_store(cache_key, result, prompt_vec)
+    return result
 
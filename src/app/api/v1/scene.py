@@ -5,14 +5,20 @@ API endpoint definitions for the Scene Builder Agent (v1)
 Defines the POST /v1/agent/scene endpoint and connects it with the real pipeline
 Validates incoming requests and returns the generated plan and Scene JSON
 """
+import asyncio
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 from src.app.core.schema import SceneSchema, SceneInputConstraints
-from src.app.agents.pipeline import run_pipeline
+from src.app.agents.pipeline import run_pipeline, dump_constraints
 
 router = APIRouter()
 
+# in-flight pipeline runs keyed by (prompt, constraints JSON); concurrent identical
+# requests await the same task instead of issuing their own Gemini call
+_INFLIGHT: Dict[tuple, asyncio.Future] = {}
+
 
 class SceneRequest(BaseModel):
     prompt: str = Field(..., description="Natural language prompt describing the desired scene(s)")
@@ -27,6 +33,27 @@ class SceneResponse(BaseModel):
     scene: SceneSchema
 
 
+async def _run_coalesced(prompt: str, constraints: Optional[SceneInputConstraints]) -> Dict[str, Any]:
+    """Run the pipeline once per distinct in-flight (prompt, constraints) pair."""
+    key = (prompt, dump_constraints(constraints))
+    task = _INFLIGHT.get(key)
+    if task is None:
+        # run_pipeline blocks on the Gemini call; keep it off the event loop. The
+        # run is its own task so cancelling any one caller, including the first,
+        # leaves it running for the others
+        task = asyncio.ensure_future(run_in_threadpool(run_pipeline, prompt, constraints))
+        _INFLIGHT[key] = task
+
+        def _done(t: asyncio.Future) -> None:
+            if _INFLIGHT.get(key) is t:
+                del _INFLIGHT[key]
+            if not t.cancelled():
+                t.exception()  # mark retrieved in case every caller went away
+
+        task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+
 @router.post("/scene", response_model=SceneResponse)
 async def generate_scene(request: SceneRequest):
     """
@@ -35,12 +62,11 @@ async def generate_scene(request: SceneRequest):
     Runs the full scene-building pipeline and returns plan + scene JSON
     """
     try:
-        result = run_pipeline(request.prompt, request.constraints)
-        scene_obj = SceneSchema.parse_obj(result["scene"])
+        result = await _run_coalesced(request.prompt, request.constraints)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=422, detail=[str(e)])
 
-    response = {"plan": result["plan"], "scene": scene_obj}
+    response = {"plan": result["plan"], "scene": result["scene"]}
     return response
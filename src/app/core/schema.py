@@ -27,13 +27,13 @@ class Action(BaseModel):
     startSec: float
     durationSec: float
     props: Dict[str, Any]
-    effects: Optional[List[Effect]] = Field(default_factory=list)
+    effects: List[Effect] = Field(default_factory=list)
 
 class Row(BaseModel):
     id: str
     kind: Literal["video", "image", "audio", "text", "captions"]
     actions: List[Action]
-    transitions: Optional[List[Effect]] = Field(default_factory=list)
+    transitions: List[Effect] = Field(default_factory=list)
 
 class SceneItem(BaseModel):
     id: str
@@ -6,8 +6,10 @@ Responsibilities:
 - Include API routes (versioned)
 - Provide a uvicorn entrypoint for local development
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import logging
 from dotenv import load_dotenv
 load_dotenv()
@@ -15,16 +17,26 @@ load_dotenv()
 
 # import router after app creation to avoid circular imports in larger projects
 from src.app.api.v1.scene import router as scene_router
+from src.app.agents.pipeline import warm_up_embedder
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # simple logging config, applied once when the server starts
+    logging.basicConfig(level=logging.INFO)
+    # load (and on first run download) the optional semantic-cache model off the event loop
+    if await run_in_threadpool(warm_up_embedder):
+        app.logger.info("Semantic response cache enabled")
+    yield
+
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Scene Builder Agent",
         description="Generates validated Scene JSON from natural language prompts",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
-    # simple logging config
-    logging.basicConfig(level=logging.INFO)
     app.logger = logging.getLogger("scene_builder")
 
     # CORS (adjust origins in production)
@@ -32,8 +44,8 @@ def create_app() -> FastAPI:
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["content-type", "authorization"],
     )
 
     # include API routers
@@ -0,0 +1,121 @@
+"""
+Tests for the run_pipeline response cache
+Stubs the Gemini model so the LLM path (the only one that is cached) is exercised
+"""
+import pytest
+import src.app.agents.pipeline as pipeline
+from src.app.agents.pipeline import run_pipeline
+from src.app.core.schema import SceneInputConstraints
+
+SCENE_JSON = (
+    '{"scenes": [{"id": "s1", "title": "Opening", "durationSec": 4,'
+    ' "assets": [{"type": "video", "src": "a.mp4"}]}],'
+    ' "meta": {"totalDurationSec": 4}}'
+)
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        return iter([_Chunk(SCENE_JSON)])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = _FakeModel()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(pipeline, "_get_model", lambda api_key: fake)
+    monkeypatch.setattr(pipeline, "_RESP_CACHE", pipeline.OrderedDict())
+    monkeypatch.setattr(pipeline, "_SEMANTIC_CACHE", pipeline.OrderedDict())
+    return fake
+
+
+def test_identical_call_hits_cache(model):
+    constraints = SceneInputConstraints(totalDurationSec=4, deterministic=True)
+    run_pipeline("Create a 4s intro", constraints)
+    run_pipeline("Create a 4s intro", constraints)
+    assert model.calls == 1
+
+
+def test_cache_hit_is_deep_copy(model):
+    constraints = SceneInputConstraints(totalDurationSec=4, deterministic=True)
+    first = run_pipeline("Create a 4s intro", constraints)
+    first["scene"].scenes[0].title = "mutated"
+    first["plan"]["notes"] = "mutated"
+
+    second = run_pipeline("Create a 4s intro", constraints)
+    assert second["scene"] is not first["scene"]
+    assert second["scene"].scenes[0].title == "Opening"
+    assert second["plan"]["notes"] != "mutated"
+
+
+def test_lru_evicts_oldest(model, monkeypatch):
+    monkeypatch.setattr(pipeline, "_RESP_CACHE_MAX", 2)
+    constraints = SceneInputConstraints(deterministic=True)
+    for prompt in ("a", "b", "c"):
+        run_pipeline(prompt, constraints)
+    assert len(pipeline._RESP_CACHE) == 2
+    assert model.calls == 3
+
+    run_pipeline("c", constraints)
+    assert model.calls == 3
+    run_pipeline("a", constraints)
+    assert model.calls == 4
+
+
+def test_deterministic_skips_semantic_tier(model, monkeypatch):
+    embedded = []
+    monkeypatch.setattr(pipeline, "_embed", lambda text: embedded.append(text))
+
+    run_pipeline("Create a 4s intro", SceneInputConstraints(deterministic=True))
+    run_pipeline("Create a 5s intro", SceneInputConstraints(deterministic=True))
+    assert embedded == []
+
+    run_pipeline("Create a 6s intro", SceneInputConstraints(deterministic=False))
+    assert embedded == ["Create a 6s intro"]
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """Stub _embed with fixed unit vectors; cosine similarity against 'base' is given per prompt."""
+    np = pytest.importorskip("numpy")
+    similarity = {"base": 1.0, "close": 0.99, "far": 0.9}
+
+    def fake_embed(text):
+        cos = similarity[text]
+        return np.array([cos, (1 - cos ** 2) ** 0.5], dtype="float32")
+
+    monkeypatch.setattr(pipeline, "_embed", fake_embed)
+
+
+def test_semantic_hit_above_threshold(model, embeddings):
+    constraints = SceneInputConstraints(totalDurationSec=4)
+    run_pipeline("base", constraints)
+    assert ("base", pipeline.dump_constraints(constraints)) in pipeline._SEMANTIC_CACHE
+
+    result = run_pipeline("close", constraints)
+    assert model.calls == 1
+    assert result["plan"]["prompt"] == "close"
+    assert result["scene"].scenes[0].title == "Opening"
+
+
+def test_semantic_miss_below_threshold(model, embeddings):
+    constraints = SceneInputConstraints(totalDurationSec=4)
+    run_pipeline("base", constraints)
+    result = run_pipeline("far", constraints)
+    assert model.calls == 2
+    assert result["plan"]["prompt"] == "far"
+
+
+def test_semantic_hit_requires_same_constraints(model, embeddings):
+    run_pipeline("base", SceneInputConstraints(totalDurationSec=4))
+    run_pipeline("close", SceneInputConstraints(totalDurationSec=8))
+    assert model.calls == 2
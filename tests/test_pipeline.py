@@ -2,7 +2,8 @@
 End to end tests for the full scene builder pipeline
 Checks for deterministic output, duration and license
 """
-from src.app.agents.pipeline import run_pipeline
+import src.app.agents.pipeline as pipeline
+from src.app.agents.pipeline import run_pipeline, _clean_gemini_json
 from src.app.core.schema import SceneInputConstraints
 
 def test_pipeline_deterministic():
@@ -19,16 +20,56 @@ def test_pipeline_deterministic():
 def test_duration_budget():
     constraints = SceneInputConstraints(totalDurationSec=15, deterministic=True)
     result = run_pipeline("Create a short intro video", constraints)
-    meta_dur = result["scene"]["meta"]["totalDurationSec"]
-    total_scene_dur = sum(s["durationSec"] for s in result["scene"]["scenes"])
+    meta_dur = result["scene"].meta.totalDurationSec
+    total_scene_dur = sum(s.durationSec for s in result["scene"].scenes)
     assert round(meta_dur, 2) == round(total_scene_dur, 2)
 
 def test_license_presence():
     constraints = SceneInputConstraints(totalDurationSec=8, deterministic=True)
     result = run_pipeline("Simple text and video", constraints)
-    for scene in result["scene"]["scenes"]:
-        for row in scene["rows"]:
-            for action in row["actions"]:
-                license_info = action["props"].get("license", {})
+    for scene in result["scene"].scenes:
+        for row in scene.rows:
+            for action in row.actions:
+                license_info = action.props.get("license", {})
                 assert "license" in license_info
                 assert license_info.get("license") == "free"
+
+def test_clean_gemini_json_strips_fences():
+    fenced = '```json\n{"scenes": [{"id": "1"}], "meta": {}}\n```'
+    assert _clean_gemini_json(fenced) == '{"scenes": [{"id": "1"}], "meta": {}}'
+    assert _clean_gemini_json('Here you go: {"a": 1} hope it helps') == '{"a": 1}'
+    assert _clean_gemini_json("  no json here  ") == "no json here"
+    assert _clean_gemini_json("") == ""
+
+
+class _StreamChunk:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            # what the SDK raises for a chunk with no text parts
+            raise ValueError("chunk has no text parts")
+        return self._text
+
+
+class _StreamingModel:
+    def generate_content(self, prompt, stream=False):
+        assert stream
+        return iter([
+            _StreamChunk('```json\n{"scenes": [{"id": "s1", "title": "Streamed", '),
+            _StreamChunk(None),
+            _StreamChunk('"durationSec": 4, "assets": [{"type": "video", "src": "a.mp4"}]}], '),
+            _StreamChunk('"meta": {"totalDurationSec": 4}}\n```'),
+        ])
+
+
+def test_streamed_chunks_are_joined(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(pipeline, "_get_model", lambda api_key: _StreamingModel())
+    monkeypatch.setattr(pipeline, "_RESP_CACHE", pipeline.OrderedDict())
+    result = run_pipeline("Streamed intro", SceneInputConstraints(deterministic=True))
+    scene = result["scene"].scenes[0]
+    assert scene.title == "Streamed"
+    assert scene.rows[0].actions[0].props["src"] == "a.mp4"
@@ -0,0 +1,68 @@
+"""
+Tests for request coalescing in the scene endpoint
+Concurrent identical requests must share one pipeline run, even if the first caller is cancelled
+"""
+import asyncio
+import threading
+import pytest
+import src.app.api.v1.scene as scene
+from src.app.core.schema import SceneInputConstraints
+
+
+@pytest.fixture
+def blocked_pipeline(monkeypatch):
+    """Fake pipeline that blocks until the test sets the returned event."""
+    release = threading.Event()
+    calls = []
+
+    def fake_run_pipeline(prompt, constraints=None):
+        calls.append(prompt)
+        release.wait(timeout=5)
+        return {"plan": {"prompt": prompt}, "scene": None}
+
+    monkeypatch.setattr(scene, "run_pipeline", fake_run_pipeline)
+    monkeypatch.setattr(scene, "_INFLIGHT", {})
+    return release, calls
+
+
+async def _wait_for_inflight():
+    while not scene._INFLIGHT:
+        await asyncio.sleep(0)
+
+
+def test_concurrent_identical_requests_run_once(blocked_pipeline):
+    release, calls = blocked_pipeline
+    constraints = SceneInputConstraints(totalDurationSec=10)
+
+    async def scenario():
+        tasks = [asyncio.create_task(scene._run_coalesced("intro", constraints)) for _ in range(3)]
+        await asyncio.wait_for(_wait_for_inflight(), timeout=5)
+        # the pipeline is blocked, so every caller has joined the single in-flight run
+        assert len(scene._INFLIGHT) == 1
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+    assert calls == ["intro"]
+    assert all(r is results[0] for r in results)
+    assert scene._INFLIGHT == {}
+
+
+def test_cancelling_first_caller_does_not_cancel_waiters(blocked_pipeline):
+    release, calls = blocked_pipeline
+
+    async def scenario():
+        first = asyncio.create_task(scene._run_coalesced("intro", None))
+        await asyncio.wait_for(_wait_for_inflight(), timeout=5)
+        second = asyncio.create_task(scene._run_coalesced("intro", None))
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert ("intro", "{}") in scene._INFLIGHT
+        release.set()
+        return await second
+
+    result = asyncio.run(scenario())
+    assert result["plan"]["prompt"] == "intro"
+    assert calls == ["intro"]
+    assert scene._INFLIGHT == {}
@@ -50,6 +50,6 @@ def test_valid_scene_schema():
         }
     }
 
-    schema_obj = SceneSchema.parse_obj(valid_scene)
+    schema_obj = SceneSchema.model_validate(valid_scene)
     assert schema_obj.meta.totalDurationSec == 10
     assert schema_obj.meta.aspectRatio == "16:9"